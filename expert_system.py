@@ -1,17 +1,127 @@
 """
 Expert System for E-commerce Fraud Detection - FINAL PRODUCTION VERSION
 """
+import functools
+import heapq
 import operator
-from typing import Dict, List, Tuple, Set, Any
+import sys
+import threading
+from array import array
+from collections.abc import MutableMapping
+from typing import Callable, Dict, List, Optional, Tuple, Set, Any
+
+
+# comparison operators, indexed by the opcode stored on each Rule condition
+_OP_TABLE = (
+    operator.gt,
+    operator.lt,
+    operator.ge,
+    operator.le,
+    operator.eq,
+    operator.ne,
+)
+_OP_CODES = {">": 0, "<": 1, ">=": 2, "<=": 3, "==": 4, "!=": 5}
+_NO_OP = -1
+_FAIL = (False, 0.0)
+
+# Global fact symbol table: every fact name a Rule references (plus the risk
+# and action facts) gets a dense slot id, shared by all engines. Slots are
+# only assigned when rules are built; other keys loaded into an engine stay in
+# that engine's own dicts.
+FACT_IDX: Dict[str, int] = {}
+FACT_NAMES: List[str] = []
+_FACT_LOCK = threading.Lock()
+
+
+def fact_index(name: str) -> int:
+    i = FACT_IDX.get(name)
+    if i is None:
+        with _FACT_LOCK:
+            i = FACT_IDX.get(name)
+            if i is None:
+                if isinstance(name, str):
+                    name = sys.intern(name)
+                # name first, so a reader that finds the id finds the name
+                FACT_NAMES.append(name)
+                i = FACT_IDX[name] = len(FACT_NAMES) - 1
+    return i
+
+
+def _no_match(current_val: Any, target_val: Any) -> bool:
+    return False
 
 
 class Rule:
+    __slots__ = (
+        "id",
+        "conditions",
+        "conclusion",
+        "strength",
+        "description",
+        "condition_facts",
+        "condition_idx",
+        "conclusion_idx",
+        "condition_opcodes",
+        "bool_conditions",
+        "num_conditions",
+    )
+
     def __init__(self, rule_id, conditions, conclusion, strength, description=""):
         self.id = rule_id
-        self.conditions = conditions
-        self.conclusion = conclusion
+        # fact names are interned so engine dict lookups hit on identity
+        self.conditions = [(sys.intern(c[0]),) + tuple(c[1:]) for c in conditions]
+        self.conclusion = sys.intern(conclusion)
         self.strength = strength
         self.description = description
+        self.condition_facts = tuple(c[0] for c in self.conditions)
+        self.condition_idx = tuple(fact_index(f) for f in self.condition_facts)
+        self.conclusion_idx = fact_index(self.conclusion)
+        self.condition_opcodes = [_OP_CODES.get(c[1], _NO_OP) for c in self.conditions]
+        # conditions split by target type at construction so evaluate() never
+        # dispatches on type: (slot, target) and (slot, op function, target)
+        self.bool_conditions: List[Tuple[int, bool]] = []
+        self.num_conditions: List[Tuple[int, Callable, Any]] = []
+        for i, c, opcode in zip(
+            self.condition_idx, self.conditions, self.condition_opcodes
+        ):
+            target_val = c[2]
+            if isinstance(target_val, bool):
+                self.bool_conditions.append((i, target_val))
+            else:
+                op = _no_match if opcode == _NO_OP else _OP_TABLE[opcode]
+                self.num_conditions.append((i, op, target_val))
+
+    def evaluate(self, values, value_set, inferred, inferred_set) -> Tuple[bool, float]:
+        """Match all premises against an engine's slot arrays; returns
+        ``(premises_met, min_premise_confidence)`` with the same semantics
+        as ``InferenceEngine._eval_condition`` applied to each condition."""
+        min_conf = 1.0
+        for i, target_val in self.bool_conditions:
+            if value_set[i]:
+                current_val = values[i]
+            elif inferred_set[i]:
+                current_val = inferred[i] > 0.0
+            else:
+                return _FAIL
+            if bool(current_val) != target_val:
+                return _FAIL
+            if inferred_set[i] and inferred[i] < min_conf:
+                min_conf = inferred[i]
+        for i, op, target_val in self.num_conditions:
+            if value_set[i]:
+                current_val = values[i]
+            elif inferred_set[i]:
+                current_val = inferred[i]
+            else:
+                return _FAIL
+            try:
+                if not op(current_val, target_val):
+                    return _FAIL
+            except Exception:
+                return _FAIL
+            if inferred_set[i] and inferred[i] < min_conf:
+                min_conf = inferred[i]
+        return True, min_conf
 
     def __repr__(self):
         return f"[{self.id}] {self.conclusion} ({self.strength})"
@@ -24,6 +134,74 @@ QUESTION_MAP = {
     "shipping_address_changed_recently": "Is this shipping address new for you? (yes/no)",
     "device_seen_before": "Have you used this device before? (yes/no)",
 }
+QUESTION_MAP = {sys.intern(k): v for k, v in QUESTION_MAP.items()}
+QUESTION_NAMES = tuple(QUESTION_MAP)
+QUESTION_IDX = {q: i for i, q in enumerate(QUESTION_NAMES)}
+N_QUESTIONS = len(QUESTION_NAMES)
+DEFAULT_VALUES = {
+    "email_age_days": 180,
+    "vpn_detected": False,
+    "shipping_address_changed_recently": False,
+    "past_chargebacks": 0,
+}
+RISK_TO_QUESTIONS = {
+    "new_device": ("device_seen_before", "user_confirmed_transaction"),
+}
+
+RISK_FACTS = (
+    "new_device",
+    "location_mismatch",
+    "high_amount",
+    "very_high_amount",
+    "suspicious_login_activity",
+    "many_failed_logins",
+    "high_velocity",
+    "very_high_velocity",
+    "high_ip_risk",
+    "medium_ip_risk",
+    "billing_shipping_mismatch_flag",
+    "recent_address_change",
+    "new_account",
+    "young_account",
+    "unverified_phone",
+    "new_email",
+    "anonymous_connection",
+)
+HIGH_SEVERITY = frozenset(
+    {
+        "high_ip_risk",
+        "many_failed_logins",
+        "very_high_velocity",
+        "very_high_amount",
+        "anonymous_connection",
+    }
+)
+MEDIUM_SEVERITY = frozenset(
+    {
+        "location_mismatch",
+        "new_device",
+        "suspicious_login_activity",
+        "high_amount",
+        "billing_shipping_mismatch_flag",
+        "recent_address_change",
+        "high_velocity",
+    }
+)
+LOW_SEVERITY = frozenset(
+    {
+        "medium_ip_risk",
+        "new_account",
+        "young_account",
+        "unverified_phone",
+        "new_email",
+    }
+)
+ACTIONS = (
+    "DECLINE_recommended",
+    "MANUAL_REVIEW_recommended",
+    "STEP_UP_VERIFY_recommended",
+    "APPROVE_recommended",
+)
 
 ALL_RULES = [
     Rule("O1", [("amount", ">", 500)], "high_amount", 0.60),
@@ -178,32 +356,506 @@ ALL_RULES = [
 ]
 
 
+def _strongly_connected(succ: List[Set[int]]) -> List[List[int]]:
+    """Tarjan's algorithm (iterative); returns components as sorted lists."""
+    n = len(succ)
+    index = [-1] * n
+    low = [0] * n
+    on_stack = [False] * n
+    stack: List[int] = []
+    components: List[List[int]] = []
+    counter = 0
+    for root in range(n):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, iter(sorted(succ[root])))]
+        while work:
+            v, edges = work[-1]
+            for w in edges:
+                if index[w] == -1:
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    work.append((w, iter(sorted(succ[w]))))
+                    break
+                if on_stack[w]:
+                    low[v] = min(low[v], index[w])
+            else:
+                work.pop()
+                if work:
+                    u = work[-1][0]
+                    low[u] = min(low[u], low[v])
+                if low[v] == index[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = False
+                        component.append(w)
+                        if w == v:
+                            break
+                    components.append(sorted(component))
+    return components
+
+
+def topological_order(rules: List[Rule]) -> List[Rule]:
+    """Order ``rules`` so every rule comes after the rules that conclude its
+    premises. Mutually dependent rules (a cycle) are kept together in list
+    order. Ties are broken by list position, so an already ordered list is
+    returned unchanged."""
+    producers: Dict[str, List[int]] = {}
+    for i, rule in enumerate(rules):
+        producers.setdefault(rule.conclusion, []).append(i)
+    dependents: List[Set[int]] = [set() for _ in rules]
+    for i, rule in enumerate(rules):
+        for f in rule.condition_facts:
+            for j in producers.get(f, ()):
+                if j != i:
+                    dependents[j].add(i)
+
+    # Kahn's algorithm over the strongly connected components, keyed by the
+    # first list position in each component
+    components = _strongly_connected(dependents)
+    component_of = [0] * len(rules)
+    for c, members in enumerate(components):
+        for i in members:
+            component_of[i] = c
+    downstream: List[Set[int]] = [set() for _ in components]
+    indegree = [0] * len(components)
+    for j, deps in enumerate(dependents):
+        for i in deps:
+            a, b = component_of[j], component_of[i]
+            if a != b and b not in downstream[a]:
+                downstream[a].add(b)
+                indegree[b] += 1
+
+    ready = [(members[0], c) for c, members in enumerate(components) if not indegree[c]]
+    heapq.heapify(ready)
+    order: List[Rule] = []
+    while ready:
+        _, c = heapq.heappop(ready)
+        order.extend(rules[i] for i in components[c])
+        for d in downstream[c]:
+            indegree[d] -= 1
+            if not indegree[d]:
+                heapq.heappush(ready, (components[d][0], d))
+    return order
+
+
+def _settles_in_one_pass(rules: List[Rule]) -> bool:
+    """True if every rule in ``rules`` comes after all other producers of
+    its premises, so one in-order pass reaches the fixed point."""
+    producers: Dict[int, List[int]] = {}
+    for i, rule in enumerate(rules):
+        producers.setdefault(rule.conclusion_idx, []).append(i)
+    return all(
+        j < i
+        for i, rule in enumerate(rules)
+        for f in rule.condition_idx
+        for j in producers.get(f, ())
+        if j != i
+    )
+
+
+def _compile_forward_chain(
+    rules: List[Rule], rule_deps: Dict[int, List[int]]
+) -> Optional[Callable]:
+    """Generate a forward_chain specialized to ``rules`` (already in
+    dependency order, with ``rule_deps`` mapping a fact slot to the rules
+    reading it): every premise check and firing is inlined with its slot
+    ids, operator, strength and dependents as constants. Returns None when a
+    target cannot be written as a literal. It works the engine's agenda
+    exactly like InferenceEngine.forward_chain: only queued rules are
+    evaluated, and a firing queues its dependents, later ones for this pass
+    and earlier ones for the next."""
+    op_symbols = {op: sym for sym, op in zip(_OP_CODES, _OP_TABLE)}
+    body: List[str] = []
+    for i, rule in enumerate(rules):
+        conds = []
+        for f, target_val in rule.bool_conditions:
+            conds.append((f, None, target_val))
+        for f, op, target_val in rule.num_conditions:
+            if op is _no_match:
+                conds = None
+                break
+            if type(target_val) not in (int, float) or not target_val - target_val == 0:
+                return None  # not a literal (or nan/inf, which repr cannot round-trip)
+            conds.append((f, op_symbols[op], target_val))
+        if conds is None:
+            continue  # an unknown operator never matches
+
+        lines = [f"# {rule.id}: {rule.conditions!r} -> {rule.conclusion}"]
+        lines.append(f"if {i} in queued and not fired[{i}]:")
+        depth = 1
+        lines.append("    " * depth + "m = 1.0")
+        for f, sym, target_val in conds:
+            pad = "    " * depth
+            if sym is None:
+                truth = "" if target_val else "not "
+                lines.append(
+                    f"{pad}if ({truth}values[{f}] if value_set[{f}] else "
+                    f"inferred_set[{f}] and {truth}inferred[{f}] > 0.0):"
+                )
+                depth += 1
+            else:
+                lines += [
+                    f"{pad}ok = False",
+                    f"{pad}if value_set[{f}] or inferred_set[{f}]:",
+                    f"{pad}    v = values[{f}] if value_set[{f}] else inferred[{f}]",
+                    f"{pad}    try:",
+                    f"{pad}        ok = True if v {sym} {target_val!r} else False",
+                    f"{pad}    except Exception:",
+                    f"{pad}        pass",
+                    f"{pad}if ok:",
+                ]
+                depth += 1
+            pad = "    " * depth
+            lines += [
+                f"{pad}if inferred_set[{f}] and inferred[{f}] < m:",
+                f"{pad}    m = inferred[{f}]",
+            ]
+        pad = "    " * depth
+        deps = rule_deps.get(rule.conclusion_idx, ())
+        later = tuple(j for j in deps if j > i)
+        earlier = tuple(j for j in deps if j <= i)
+        lines.append(f"{pad}if apply(RULES[{i}], m * {rule.strength!r}):")
+        if later:
+            lines.append(f"{pad}    queued.update({later!r})")
+        if earlier:
+            lines.append(f"{pad}    requeued.update({earlier!r})")
+        if not (later or earlier):
+            lines.append(f"{pad}    pass")
+        body += lines
+
+    src = [
+        "def forward_chain(engine):",
+        "    engine._ensure_slots()",
+        "    values, value_set = engine._values, engine._value_set",
+        "    inferred, inferred_set = engine._inferred, engine._inferred_set",
+        "    fired, apply = engine._fired, engine._apply_rule",
+        "    queued, engine._queued = engine._queued, set()",
+        "    iteration = 0",
+        "    while queued and iteration < MAX_ITERATIONS:",
+        "        iteration += 1",
+        "        requeued = set()",
+    ]
+    src += ["        " + line for line in body]
+    src += [
+        "        queued = requeued",
+        "    # anything still pending when the iteration cap hit is kept for later",
+        "    engine._queued.update(queued)",
+    ]
+
+    namespace = {
+        "RULES": rules,
+        "MAX_ITERATIONS": max(50, len(rules) * 3),
+    }
+    exec(compile("\n".join(src) + "\n", "<forward_chain>", "exec"), namespace)
+    return namespace["forward_chain"]
+
+
+class _RulePlan:
+    """Matching structures derived from one rule list, shared by every
+    engine built over that list."""
+
+    __slots__ = ("ordered_rules", "rule_deps", "rule_idx", "unconditional", "chain")
+
+    def __init__(self, rules: List[Rule], specialize: bool = False):
+        # rules are matched in dependency order; rule_deps maps a fact slot
+        # to the positions (in that order) of the rules that read it
+        self.ordered_rules = topological_order(rules)
+        self.rule_deps: Dict[int, List[int]] = {}
+        # rules sharing an id fire (and skip) together
+        self.rule_idx: Dict[str, List[int]] = {}
+        for i, rule in enumerate(self.ordered_rules):
+            for f in dict.fromkeys(rule.condition_idx):
+                self.rule_deps.setdefault(f, []).append(i)
+            self.rule_idx.setdefault(rule.id, []).append(i)
+        self.unconditional = [
+            i for i, rule in enumerate(self.ordered_rules) if not rule.conditions
+        ]
+        self.chain = (
+            _compile_forward_chain(self.ordered_rules, self.rule_deps)
+            if specialize
+            else None
+        )
+
+
+@functools.lru_cache(maxsize=32)
+def _cached_plan(rules: Tuple[Rule, ...]) -> _RulePlan:
+    return _RulePlan(list(rules))
+
+
+# ALL_RULES keeps its plan (with the generated forward_chain) for the life of
+# the process; other rule lists share a small LRU keyed on their contents
+_ALL_RULES_KEY = tuple(ALL_RULES)
+_ALL_RULES_PLAN = _RulePlan(ALL_RULES, specialize=True)
+
+
+def _plan_for(rules: List[Rule]) -> _RulePlan:
+    key = tuple(rules)
+    if rules is ALL_RULES and key == _ALL_RULES_KEY:
+        return _ALL_RULES_PLAN
+    return _cached_plan(key)
+
+
+_RISK_IDX = tuple(fact_index(f) for f in RISK_FACTS)
+_ACTION_IDX = tuple(fact_index(a) for a in ACTIONS)
+
+
+class _SlotView(MutableMapping):
+    """Dict-style view over one of an engine's fact stores: the slot arrays
+    for facts with a slot, a plain dict for any other key. Iterates in
+    insertion order, like the dict it stands in for. Views are built on
+    access, so an engine never refers to itself through them."""
+
+    __slots__ = ("_engine", "_slots", "_present", "_extra", "_order", "_inferred")
+
+    def __init__(self, engine, slots, present, extra, order, inferred):
+        self._engine = engine
+        self._slots = slots
+        self._present = present
+        self._extra = extra
+        self._order = order
+        self._inferred = inferred
+
+    def __getitem__(self, name):
+        i = FACT_IDX.get(name)
+        if i is None or i >= len(self._present):
+            return self._extra[name]
+        if not self._present[i]:
+            raise KeyError(name)
+        return self._slots[i]
+
+    def get(self, name, default=None):
+        i = FACT_IDX.get(name)
+        if i is None or i >= len(self._present):
+            return self._extra.get(name, default)
+        return self._slots[i] if self._present[i] else default
+
+    def __contains__(self, name):
+        i = FACT_IDX.get(name)
+        if i is None or i >= len(self._present):
+            return name in self._extra
+        return bool(self._present[i])
+
+    def __setitem__(self, name, value):
+        if self._inferred:
+            self._engine._set_inferred(name, value)
+        else:
+            self._engine._set_value(name, value)
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        if self._inferred:
+            self._engine._discard_inferred(name)
+        else:
+            self._engine._discard_value(name)
+
+    def __iter__(self):
+        return iter(list(self._order))
+
+    def __len__(self):
+        return len(self._order)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
 class InferenceEngine:
     MAX_CONFIDENCE = 1.0
     MIN_CONFIDENCE = 0.0
 
+    __slots__ = (
+        "rules",
+        "_values",
+        "_value_set",
+        "_value_extra",
+        "_value_order",
+        "_inferred",
+        "_inferred_set",
+        "_inferred_extra",
+        "_inferred_order",
+        "trace",
+        "asked_questions",
+        "_ordered_rules",
+        "_rule_idx",
+        "_chain",
+        "_fired",
+        "rule_deps",
+        "_queued",
+        "_epoch",
+        "_active_epoch",
+        "_active",
+        "_risk_epoch",
+        "_risk_level",
+        "_recs_epoch",
+        "_recs",
+    )
+
     def __init__(self, rules: List[Rule]):
         self.rules = rules
-        self.values: Dict[str, any] = {}
-        self.inferred_facts: Dict[str, float] = {}
+        # facts with a slot live in arrays indexed by fact_index(), any other
+        # key in a per-engine dict; the order lists hold names in insertion
+        # order. values and inferred_facts expose each pair as one mapping.
+        n = len(FACT_NAMES)
+        self._values: List[Any] = [None] * n
+        self._value_set = bytearray(n)
+        self._value_extra: Dict[str, Any] = {}
+        self._value_order: List[str] = []
+        self._inferred = array("d", [0.0]) * n
+        self._inferred_set = bytearray(n)
+        self._inferred_extra: Dict[str, float] = {}
+        self._inferred_order: List[str] = []
         self.trace: List[str] = []
-        self.fired_rules: Set[str] = set()
         self.asked_questions: Set[str] = set()
 
+        plan = _plan_for(rules)
+        self._ordered_rules = plan.ordered_rules
+        self.rule_deps = plan.rule_deps
+        self._rule_idx = plan.rule_idx
+        self._chain = plan.chain
+        # fired flags by position in _ordered_rules
+        self._fired = bytearray(len(self._ordered_rules))
+        # agenda carried between forward_chain calls: positions of rules whose
+        # inputs changed since they were last evaluated. Rules without
+        # premises start on it since nothing else will ever trigger them.
+        self._queued: Set[int] = set(plan.unconditional)
+        # derived risk/recommendation results, each cached with the inference
+        # epoch it was computed at; _epoch is bumped whenever inferred_facts
+        # changes
+        self._epoch = 0
+        self._active_epoch = -1
+        self._active: List[str] = None
+        self._risk_epoch = -1
+        self._risk_level: float = None
+        self._recs_epoch = -1
+        self._recs: List[Tuple[str, float]] = None
+
+    @property
+    def values(self) -> Dict[str, Any]:
+        return _SlotView(
+            self,
+            self._values,
+            self._value_set,
+            self._value_extra,
+            self._value_order,
+            False,
+        )
+
+    @property
+    def inferred_facts(self) -> Dict[str, float]:
+        return _SlotView(
+            self,
+            self._inferred,
+            self._inferred_set,
+            self._inferred_extra,
+            self._inferred_order,
+            True,
+        )
+
+    @property
+    def fired_rules(self) -> Set[str]:
+        rules = self._ordered_rules
+        return {rules[i].id for i, fired in enumerate(self._fired) if fired}
+
+    def _ensure_slots(self) -> None:
+        old = len(self._value_set)
+        grow = len(FACT_NAMES) - old
+        if grow > 0:
+            self._values.extend([None] * grow)
+            self._value_set.extend(bytes(grow))
+            self._inferred.extend([0.0] * grow)
+            self._inferred_set.extend(bytes(grow))
+            # keys loaded before a rule gave them a slot move into it
+            for i in range(old, old + grow):
+                name = FACT_NAMES[i]
+                if name in self._value_extra:
+                    self._value_set[i] = 1
+                    self._values[i] = self._value_extra.pop(name)
+                if name in self._inferred_extra:
+                    self._inferred_set[i] = 1
+                    self._inferred[i] = self._inferred_extra.pop(name)
+
+    def _set_value(self, name: str, value: Any) -> None:
+        i = FACT_IDX.get(name)
+        if i is None:
+            # no rule reads it: kept off the slot table
+            if name not in self._value_extra:
+                self._value_order.append(name)
+            self._value_extra[name] = value
+            return
+        self._ensure_slots()
+        if not self._value_set[i]:
+            self._value_set[i] = 1
+            self._value_order.append(name)
+        self._values[i] = value
+        self._propagate(i)
+
+    def _discard_value(self, name: str) -> None:
+        self._value_order.remove(name)
+        i = FACT_IDX.get(name)
+        if i is None or i >= len(self._value_set):
+            del self._value_extra[name]
+            return
+        self._value_set[i] = 0
+        self._values[i] = None
+        self._propagate(i)
+
+    def _set_inferred(self, name: str, conf: float) -> None:
+        self._epoch += 1
+        i = FACT_IDX.get(name)
+        if i is None:
+            if name not in self._inferred_extra:
+                self._inferred_order.append(name)
+            self._inferred_extra[name] = conf
+            return
+        self._ensure_slots()
+        if not self._inferred_set[i]:
+            self._inferred_set[i] = 1
+            self._inferred_order.append(name)
+        self._inferred[i] = conf
+        self._propagate(i)
+
+    def _discard_inferred(self, name: str) -> None:
+        self._epoch += 1
+        self._inferred_order.remove(name)
+        i = FACT_IDX.get(name)
+        if i is None or i >= len(self._inferred_set):
+            del self._inferred_extra[name]
+            return
+        self._inferred_set[i] = 0
+        self._inferred[i] = 0.0
+        self._propagate(i)
+
+    def _propagate(self, i: int) -> None:
+        deps = self.rule_deps.get(i)
+        if deps:
+            self._queued.update(deps)
+
     # Replace the existing load_data method with the following:
     def load_data(self, data: Dict[str, Any]) -> None:
-        data = dict(data)  # defensive copy; do NOT mutate caller's dict
-        defaults = {
-            "email_age_days": 180,
-            "vpn_detected": False,
-            "shipping_address_changed_recently": False,
-            "past_chargebacks": 0,
-        }
-        for k, v in defaults.items():
-            data.setdefault(k, v)
-        # merge into internal values (preserve previously-loaded values if needed)
-        self.values.update(data)
-
+        # caller's dict is only read, never mutated; defaults fill missing keys
+        for k, v in data.items():
+            self.set_fact(k, v)
+        for k, v in DEFAULT_VALUES.items():
+            if k not in data:
+                self.set_fact(k, v)
+
+    def set_fact(self, name: str, value: Any) -> None:
+        """Set one input fact, without applying load_data's defaults."""
+        self._set_value(name, value)
+
+    # Reference semantics for a single condition, kept readable on purpose:
+    # no engine code calls this any more (matching runs through
+    # Rule.evaluate and the generated chain), it is the oracle that
+    # test_rule_evaluate_matches_eval_condition checks Rule.evaluate against.
+    # Do not optimize it or route the hot path back through it.
     def _eval_condition(self, condition: Tuple) -> Tuple[bool, float]:
         fact_name, op_str, target_val = condition
 
@@ -223,234 +875,239 @@ class InferenceEngine:
         else:
             return False, self.MIN_CONFIDENCE
 
-        ops = {
-            ">": operator.gt,
-            "<": operator.lt,
-            ">=": operator.ge,
-            "<=": operator.le,
-            "==": operator.eq,
-            "!=": operator.ne,
-        }
-
         # Boolean target: return inferred confidence (not 1.0) when fact was derived.
         if isinstance(target_val, bool):
             result = bool(current_val) == target_val
             return (result, confidence if result else self.MIN_CONFIDENCE)
 
         # Numeric/comparison target: try to compare using current_val
+        opcode = _OP_CODES.get(op_str, _NO_OP)
+        if opcode == _NO_OP:
+            return False, self.MIN_CONFIDENCE
         try:
-            if op_str not in ops:
-                return False, self.MIN_CONFIDENCE
-            if ops[op_str](current_val, target_val):
+            if _OP_TABLE[opcode](current_val, target_val):
                 return True, confidence
             return False, self.MIN_CONFIDENCE
         except Exception:
             return False, self.MIN_CONFIDENCE
 
     def _combine_confidence(self, c1: float, c2: float) -> float:
-        combined = c1 + c2 - (c1 * c2)
-        return min(max(combined, self.MIN_CONFIDENCE), self.MAX_CONFIDENCE)
+        # c1, c2 in [0, 1] keeps c1 + c2 - c1 * c2 in [0, 1]; no clamp needed
+        assert 0.0 <= c1 <= 1.0 and 0.0 <= c2 <= 1.0, (c1, c2)
+        return c1 + c2 - c1 * c2
 
     def forward_chain(self):
+        if self._chain is not None:
+            # generated for ALL_RULES: the loop below with every rule inlined
+            self._chain(self)
+            return
+
         max_iterations = max(50, len(self.rules) * 3)
         iteration = 0
-        changed = True
 
-        while changed and iteration < max_iterations:
-            changed = False
+        # Only rules whose inputs changed since the last call are evaluated,
+        # and a rule is revisited only when one of its inputs changes. Rules
+        # run in dependency order, so an acyclic rule set settles in a single
+        # pass; only an update to a rule earlier in the order (a cycle)
+        # requeues it for the next pass.
+        self._ensure_slots()
+        queued, self._queued = self._queued, set()
+
+        rules = self._ordered_rules
+        values, value_set = self._values, self._value_set
+        inferred, inferred_set = self._inferred, self._inferred_set
+        fired = self._fired
+        while queued and iteration < max_iterations:
             iteration += 1
-
-            for rule in self.rules:
-                if rule.id in self.fired_rules:
+            agenda = sorted(queued)
+            on_agenda = set(agenda)
+            queued = set()
+
+            while agenda:
+                i = heapq.heappop(agenda)
+                on_agenda.discard(i)
+                if fired[i]:
                     continue
+                rule = rules[i]
 
-                premises_met = True
-                min_premise_confidence = self.MAX_CONFIDENCE
-
-                # Evaluate premises with debug printing
-                for cond in rule.conditions:
-                    ok, conf = self._eval_condition(cond)
-                    # cond is tuple like (fact, op, val)
-                    if not ok:
-                        premises_met = False
-                        break
-                    min_premise_confidence = min(min_premise_confidence, conf)
-
+                premises_met, min_premise_confidence = rule.evaluate(
+                    values, value_set, inferred, inferred_set
+                )
                 if not premises_met:
                     continue
 
-                inferred_conf = min_premise_confidence * rule.strength
-                prev_conf = self.inferred_facts.get(
-                    rule.conclusion, self.MIN_CONFIDENCE
-                )
-                self.fired_rules.add(rule.id)
-
-                if rule.conclusion not in self.inferred_facts:
-                    self.inferred_facts[rule.conclusion] = inferred_conf
-                    self.values[rule.conclusion] = True
-                    self.trace.append(
-                        f"Fired {rule.id}: '{rule.conclusion}' = {inferred_conf:.2f}"
-                    )
-                    changed = True
-                else:
-                    combined = self._combine_confidence(prev_conf, inferred_conf)
-                    if combined > prev_conf + 1e-12:
-                        self.inferred_facts[rule.conclusion] = combined
-                        self.trace.append(
-                            f"Updated '{rule.conclusion}': {prev_conf:.2f} -> {combined:.2f} via {rule.id}"
-                        )
-                        changed = True
+                if not self._apply_rule(rule, min_premise_confidence * rule.strength):
+                    continue
+
+                # activate dependents: still ahead in this pass, else next pass
+                for j in self.rule_deps.get(rule.conclusion_idx, ()):
+                    if j > i:
+                        if j not in on_agenda:
+                            heapq.heappush(agenda, j)
+                            on_agenda.add(j)
+                    else:
+                        queued.add(j)
+
+        # anything still pending when the iteration cap hit is kept for later
+        self._queued.update(queued)
+
+    def _apply_rule(self, rule: Rule, inferred_conf: float) -> bool:
+        """Record ``rule`` firing with ``inferred_conf``; True if its
+        conclusion was added or its confidence increased."""
+        c = rule.conclusion_idx
+        for j in self._rule_idx[rule.id]:
+            self._fired[j] = 1
+
+        if not self._inferred_set[c]:
+            self._inferred_set[c] = 1
+            self._inferred_order.append(rule.conclusion)
+            self._inferred[c] = inferred_conf
+            if not self._value_set[c]:
+                self._value_set[c] = 1
+                self._value_order.append(rule.conclusion)
+            self._values[c] = True
+            self.trace.append(
+                f"Fired {rule.id}: '{rule.conclusion}' = {inferred_conf:.2f}"
+            )
+        else:
+            prev_conf = self._inferred[c]
+            combined = self._combine_confidence(prev_conf, inferred_conf)
+            if combined <= prev_conf + 1e-12:
+                return False
+            self._inferred[c] = combined
+            self.trace.append(
+                f"Updated '{rule.conclusion}': {prev_conf:.2f} -> {combined:.2f} via {rule.id}"
+            )
+        self._epoch += 1
+        return True
 
     def get_active_risk_indicators(self) -> List[str]:
-        risk_facts = [
-            "new_device",
-            "location_mismatch",
-            "high_amount",
-            "very_high_amount",
-            "suspicious_login_activity",
-            "many_failed_logins",
-            "high_velocity",
-            "very_high_velocity",
-            "high_ip_risk",
-            "medium_ip_risk",
-            "billing_shipping_mismatch_flag",
-            "recent_address_change",
-            "new_account",
-            "young_account",
-            "unverified_phone",
-            "new_email",
-            "anonymous_connection",
-        ]
-        active = []
-        for fact in risk_facts:
-            conf = self.inferred_facts.get(fact, 0.0)
-            if conf > 0.5:
-                active.append(fact)
-        return active
+        if self._active_epoch != self._epoch:
+            inferred, inferred_set = self._inferred, self._inferred_set
+            self._active = [
+                FACT_NAMES[i]
+                for i in _RISK_IDX
+                if inferred_set[i] and inferred[i] > 0.5
+            ]
+            self._active_epoch = self._epoch
+        return list(self._active)
 
     def calculate_risk_level(self) -> float:
-        active = self.get_active_risk_indicators()
-
-        high_severity = {
-            "high_ip_risk",
-            "many_failed_logins",
-            "very_high_velocity",
-            "very_high_amount",
-            "anonymous_connection",
-        }
-        medium_severity = {
-            "location_mismatch",
-            "new_device",
-            "suspicious_login_activity",
-            "high_amount",
-            "billing_shipping_mismatch_flag",
-            "recent_address_change",
-            "high_velocity",
-        }
-        low_severity = {
-            "medium_ip_risk",
-            "new_account",
-            "young_account",
-            "unverified_phone",
-            "new_email",
-        }
+        if self._risk_epoch == self._epoch:
+            return self._risk_level
 
+        active = self.get_active_risk_indicators()
+        inferred = self.inferred_facts
         score = 0.0
         for r in active:
-            conf = self.inferred_facts.get(r, 0.0)
-            if r in high_severity:
+            conf = inferred.get(r, 0.0)
+            if r in HIGH_SEVERITY:
                 score += conf * 0.35
-            elif r in medium_severity:
+            elif r in MEDIUM_SEVERITY:
                 score += conf * 0.20
-            elif r in low_severity:
+            elif r in LOW_SEVERITY:
                 score += conf * 0.10
-        return min(score, 1.0)
+        self._risk_level = min(score, 1.0)
+        self._risk_epoch = self._epoch
+        return self._risk_level
 
     def has_explainable_anomalies(self) -> bool:
-        if (
-            "location_mismatch" in self.inferred_facts
-            and "location_explained" not in self.inferred_facts
-        ):
+        inferred = self.inferred_facts
+        if "location_mismatch" in inferred and "location_explained" not in inferred:
             return True
         if (
-            "recent_address_change" in self.inferred_facts
+            "recent_address_change" in inferred
             and "shipping_address_changed_recently" not in self.asked_questions
         ):
             return True
         return False
 
-    def find_relevant_questions(self) -> List[Tuple[str, float, str]]:
-        questions_scored = {}
-        active_risks = self.get_active_risk_indicators()
-        overall_risk = self.calculate_risk_level()
-
-        if (
-            "location_mismatch" in active_risks
-            and "location_explained" not in self.inferred_facts
-        ):
+    def find_relevant_questions(
+        self,
+        active_risks: List[str] = None,
+        overall_risk: float = None,
+        recs: List[Tuple[str, float]] = None,
+    ) -> List[Tuple[str, float, str]]:
+        """Rank unasked questions. Callers that already hold the current
+        indicators, risk level or recommendations can pass them in."""
+        # scores/reasons indexed by QUESTION_IDX; `added` keeps first-scored
+        # order so ties rank exactly as before
+        scores = [0.0] * N_QUESTIONS
+        reasons = [""] * N_QUESTIONS
+        scored = bytearray(N_QUESTIONS)
+        added: List[int] = []
+        asked = self.asked_questions
+        inferred = self.inferred_facts
+        if active_risks is None:
+            active_risks = self.get_active_risk_indicators()
+        if overall_risk is None:
+            overall_risk = self.calculate_risk_level()
+
+        if "location_mismatch" in active_risks and "location_explained" not in inferred:
             q = "user_confirmed_travel"
-            if q not in self.asked_questions:
-                questions_scored[q] = (1.00, "Explain location anomaly")
+            if q not in asked:
+                i = QUESTION_IDX[q]
+                scores[i], reasons[i] = 1.00, "Explain location anomaly"
+                scored[i] = 1
+                added.append(i)
 
         if "recent_address_change" in active_risks:
             q = "shipping_address_changed_recently"
-            if q not in self.asked_questions and q not in questions_scored:
-                questions_scored[q] = (0.90, "Confirm address change")
+            i = QUESTION_IDX[q]
+            if q not in asked and not scored[i]:
+                scores[i], reasons[i] = 0.90, "Confirm address change"
+                scored[i] = 1
+                added.append(i)
 
         # low-risk, no explainable anomalies → return what's already queued (consistent tuple shape)
         if overall_risk < 0.12 and not self.has_explainable_anomalies():
-            return [
-                (q, score, reason) for q, (score, reason) in questions_scored.items()
-            ]
-
-        risk_to_questions = {
-            "new_device": ["device_seen_before", "user_confirmed_transaction"],
-        }
+            return [(QUESTION_NAMES[i], scores[i], reasons[i]) for i in added]
 
         for risk in active_risks:
-            if risk in risk_to_questions:
-                for q in risk_to_questions[risk]:
-                    if q in QUESTION_MAP and q not in self.asked_questions:
-                        if q not in questions_scored:
-                            risk_conf = self.inferred_facts.get(risk, 0.5)
-                            questions_scored[q] = (risk_conf * 0.80, f"Address {risk}")
+            for q in RISK_TO_QUESTIONS.get(risk, ()):
+                i = QUESTION_IDX.get(q)
+                if i is not None and q not in asked and not scored[i]:
+                    risk_conf = inferred.get(risk, 0.5)
+                    scores[i], reasons[i] = risk_conf * 0.80, f"Address {risk}"
+                    scored[i] = 1
+                    added.append(i)
 
         if overall_risk > 0.45 or self.values.get("amount", 0) > 1500:
             for q in ["user_confirmed_transaction", "otp_passed"]:
-                if q not in self.asked_questions and q not in questions_scored:
-                    questions_scored[q] = (0.65, "High-risk verification")
-
-        recs = self.get_recommendations()
+                i = QUESTION_IDX[q]
+                if q not in asked and not scored[i]:
+                    scores[i], reasons[i] = 0.65, "High-risk verification"
+                    scored[i] = 1
+                    added.append(i)
+
+        if recs is None:
+            recs = self.get_recommendations()
         if len(recs) >= 2:
             top_conf, second_conf = recs[0][1], recs[1][1]
             if abs(top_conf - second_conf) < 0.20:
                 for q in ["user_confirmed_transaction", "otp_passed"]:
-                    if q not in self.asked_questions:
-                        if q in questions_scored:
-                            score, reason = questions_scored[q]
-                            questions_scored[q] = (
-                                score * 1.2,
-                                f"{reason} + disambiguate",
-                            )
+                    if q not in asked:
+                        i = QUESTION_IDX[q]
+                        if scored[i]:
+                            scores[i] *= 1.2
+                            reasons[i] = f"{reasons[i]} + disambiguate"
                         else:
-                            questions_scored[q] = (0.70, "Close decision")
+                            scores[i], reasons[i] = 0.70, "Close decision"
+                            scored[i] = 1
+                            added.append(i)
 
-        result = [(q, score, reason) for q, (score, reason) in questions_scored.items()]
+        result = [(QUESTION_NAMES[i], scores[i], reasons[i]) for i in added]
         result.sort(key=lambda x: x[1], reverse=True)
         return result
 
     def get_recommendations(self) -> List[Tuple[str, float]]:
-        actions = [
-            "DECLINE_recommended",
-            "MANUAL_REVIEW_recommended",
-            "STEP_UP_VERIFY_recommended",
-            "APPROVE_recommended",
-        ]
+        if self._recs_epoch == self._epoch:
+            return list(self._recs)
 
         results = []
-        for act in actions:
-            if act in self.inferred_facts:
-                results.append((act, self.inferred_facts[act]))
+        for act, i in zip(ACTIONS, _ACTION_IDX):
+            if self._inferred_set[i]:
+                results.append((act, self._inferred[i]))
 
         if not results:
             risk_level = self.calculate_risk_level()
@@ -461,15 +1118,22 @@ class InferenceEngine:
             else:
                 results.append(("STEP_UP_VERIFY_recommended", 0.55))
 
-        return sorted(results, key=lambda x: x[1], reverse=True)
+        results.sort(key=lambda x: x[1], reverse=True)
+        self._recs = results
+        self._recs_epoch = self._epoch
+        return list(results)
 
-    def should_continue_asking(self) -> bool:
-        recs = self.get_recommendations()
+    def should_continue_asking(
+        self, recs: List[Tuple[str, float]] = None, risk_level: float = None
+    ) -> bool:
+        if recs is None:
+            recs = self.get_recommendations()
         if not recs:
             return False
 
         top_action, top_conf = recs[0]
-        risk_level = self.calculate_risk_level()
+        if risk_level is None:
+            risk_level = self.calculate_risk_level()
 
         if self.has_explainable_anomalies():
             return True
@@ -492,80 +1156,99 @@ class InferenceEngine:
         return risk_level > 0.25 and top_conf < 0.80
 
 
-def run_expert_system(initial_data: Dict, auto_answer: Dict[str, bool] = None):
+def run_expert_system(
+    initial_data: Dict, auto_answer: Dict[str, bool] = None, verbose: bool = True
+) -> InferenceEngine:
+    """Run the interactive session and return the engine it left behind.
+    With ``verbose=False`` no report is built or written; only a question
+    that ``auto_answer`` does not cover is, right before its answer is read."""
     engine = InferenceEngine(ALL_RULES)
     engine.load_data(initial_data)
+    # report lines are buffered and written in one go
+    out: List[str] = []
 
-    print("\n" + "=" * 60)
-    print("FRAUD DETECTION EXPERT SYSTEM")
-    print("=" * 60 + "\n")
+    if verbose:
+        out.append("\n" + "=" * 60)
+        out.append("FRAUD DETECTION EXPERT SYSTEM")
+        out.append("=" * 60 + "\n")
 
-    print("Transaction Data:")
-    for key, value in sorted(initial_data.items()):
-        print(f"  {key}: {value}")
+        out.append("Transaction Data:")
+        for key, value in sorted(initial_data.items()):
+            out.append(f"  {key}: {value}")
 
     max_questions = 5
     questions_asked = 0
 
     while questions_asked < max_questions:
-        print(f"\n[Step {questions_asked + 1}] Analyzing...")
+        if verbose:
+            out.append(f"\n[Step {questions_asked + 1}] Analyzing...")
         engine.forward_chain()
 
         active_risks = engine.get_active_risk_indicators()
         risk_level = engine.calculate_risk_level()
+        recs = engine.get_recommendations()
 
-        print(f"\nRisk Level: {risk_level:.2f}")
-        if active_risks:
-            print(f"Active Indicators: {', '.join(active_risks)}")
-        else:
-            print("Active Indicators: None")
+        if verbose:
+            out.append(f"\nRisk Level: {risk_level:.2f}")
+            if active_risks:
+                out.append(f"Active Indicators: {', '.join(active_risks)}")
+            else:
+                out.append("Active Indicators: None")
 
-        recs = engine.get_recommendations()
-        print("\nCurrent Assessment:")
-        for action, conf in recs[:3]:
-            action_label = action.replace("_recommended", "").replace("_", " ").upper()
-            print(f"  {action_label}: {conf:.2f}")
-
-        if not engine.should_continue_asking():
-            top_action, top_conf = recs[0]
-            print(
-                f"\n>>> FINAL: {top_action.replace('_recommended', '').replace('_', ' ').upper()} ({top_conf:.2f})"
-            )
-            break
+            out.append("\nCurrent Assessment:")
+            for action, conf in recs[:3]:
+                action_label = (
+                    action.replace("_recommended", "").replace("_", " ").upper()
+                )
+                out.append(f"  {action_label}: {conf:.2f}")
 
-        relevant_questions = engine.find_relevant_questions()
+        if not engine.should_continue_asking(recs, risk_level):
+            relevant_questions = None
+        else:
+            relevant_questions = engine.find_relevant_questions(
+                active_risks, risk_level, recs
+            )
 
         if not relevant_questions:
-            top_action, top_conf = recs[0]
-            print(
-                f"\n>>> FINAL: {top_action.replace('_recommended', '').replace('_', ' ').upper()} ({top_conf:.2f})"
-            )
+            if verbose:
+                top_action, top_conf = recs[0]
+                out.append(
+                    f"\n>>> FINAL: {top_action.replace('_recommended', '').replace('_', ' ').upper()} ({top_conf:.2f})"
+                )
             break
 
         question_fact, score, reason = relevant_questions[0]
         engine.asked_questions.add(question_fact)
 
-        print(f"\n[?] {QUESTION_MAP[question_fact]}")
-        print(f"    ({reason})")
-
         if auto_answer and question_fact in auto_answer:
             val = auto_answer[question_fact]
-            ans_text = "yes" if val else "no"
-            print(f"    Auto-answer: {ans_text}")
+            if verbose:
+                ans_text = "yes" if val else "no"
+                out.append(f"\n[?] {QUESTION_MAP[question_fact]}")
+                out.append(f"    ({reason})")
+                out.append(f"    Auto-answer: {ans_text}")
         else:
+            # the question must be on screen before input() prompts for it
+            out.append(f"\n[?] {QUESTION_MAP[question_fact]}")
+            out.append(f"    ({reason})")
+            sys.stdout.write("\n".join(out) + "\n")
+            out.clear()
             ans = input("    Answer: ").strip().lower()
             val = ans in ["yes", "y", "1", "true"]
 
-        engine.load_data({question_fact: val})
+        engine.set_fact(question_fact, val)
 
         questions_asked += 1
 
-    print("\n" + "=" * 60)
-    print("REASONING TRACE")
-    print("=" * 60)
-    for line in engine.trace:
-        print(f"  {line}")
-    print()
+    if verbose:
+        out.append("\n" + "=" * 60)
+        out.append("REASONING TRACE")
+        out.append("=" * 60)
+        for line in engine.trace:
+            out.append(f"  {line}")
+        out.append("")
+        sys.stdout.write("\n".join(out) + "\n")
+    return engine
 
 
 if __name__ == "__main__":
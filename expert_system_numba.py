@@ -0,0 +1,379 @@
+"""
+Numba kernel for bulk forward chaining.
+
+Rules are lowered once to a flat condition stream with CSR-style per-rule
+offsets, and fact values to float arrays, so a full pass over the rules runs
+as one compiled call.
+
+``score_batch(df)`` is the bulk entry point: every row of a
+``pandas.DataFrame`` is chained to a fixed point inside a single compiled
+call, giving the same result frame as ``expert_system_batch.score_batch``.
+
+``forward_chain(engine)`` runs the kernel for one engine and replays the
+firings it reports through the engine, so its facts, trace and caches end up
+exactly as ``InferenceEngine.forward_chain`` leaves them. Copying one
+engine's facts in and out costs more than the kernel saves on rule sets this
+size, so engines with a generated chain (those built on ``ALL_RULES``) just
+run that; the per-engine kernel path is kept for parity with custom rule
+sets, not for speed.
+
+Both fall back to the interpreted code when numba is not installed or when
+the rules or loaded data are not numeric/boolean.
+"""
+import functools
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+import expert_system_batch
+from expert_system import (
+    ACTIONS,
+    ALL_RULES,
+    FACT_IDX,
+    RISK_FACTS,
+    InferenceEngine,
+    Rule,
+    _settles_in_one_pass,
+    topological_order,
+)
+
+try:
+    from numba import njit
+except ImportError:  # interpreted fallback only
+    njit = None
+
+
+class LoweredRules(NamedTuple):
+    rules: List[Rule]
+    fact_idx: Dict[str, int]
+    cond_fact_idx: np.ndarray
+    cond_op: np.ndarray
+    cond_target: np.ndarray
+    cond_is_bool: np.ndarray
+    rule_cond_start: np.ndarray
+    rule_cond_end: np.ndarray
+    rule_strength: np.ndarray
+    rule_conclusion_idx: np.ndarray
+    single_pass: bool  # one in-order pass reaches the fixed point
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (bool, int, float))
+
+
+def lower_rules(rules: List[Rule]) -> Optional[LoweredRules]:
+    """Flatten ``rules`` into kernel arrays in dependency order, or None if
+    they cannot be lowered (non-numeric targets or duplicate rule ids)."""
+    if len({rule.id for rule in rules}) != len(rules):
+        return None
+    rules = topological_order(rules)
+
+    fact_idx: Dict[str, int] = {}
+    for rule in rules:
+        for name in rule.condition_facts + (rule.conclusion,):
+            fact_idx.setdefault(name, len(fact_idx))
+
+    cond_fact_idx, cond_op, cond_target, cond_is_bool = [], [], [], []
+    rule_cond_start, rule_cond_end = [], []
+    for rule in rules:
+        rule_cond_start.append(len(cond_fact_idx))
+        for (fact_name, _, target_val), opcode in zip(
+            rule.conditions, rule.condition_opcodes
+        ):
+            if not _is_number(target_val):
+                return None
+            cond_fact_idx.append(fact_idx[fact_name])
+            cond_op.append(opcode)
+            cond_target.append(float(target_val))
+            cond_is_bool.append(isinstance(target_val, bool))
+        rule_cond_end.append(len(cond_fact_idx))
+
+    return LoweredRules(
+        rules=rules,
+        fact_idx=fact_idx,
+        cond_fact_idx=np.array(cond_fact_idx, dtype=np.int32),
+        cond_op=np.array(cond_op, dtype=np.int8),
+        cond_target=np.array(cond_target, dtype=np.float64),
+        cond_is_bool=np.array(cond_is_bool, dtype=np.bool_),
+        rule_cond_start=np.array(rule_cond_start, dtype=np.int32),
+        rule_cond_end=np.array(rule_cond_end, dtype=np.int32),
+        rule_strength=np.array([r.strength for r in rules], dtype=np.float64),
+        rule_conclusion_idx=np.array(
+            [fact_idx[r.conclusion] for r in rules], dtype=np.int32
+        ),
+        single_pass=_settles_in_one_pass(rules),
+    )
+
+
+def _chain(
+    cond_fact_idx,
+    cond_op,
+    cond_target,
+    cond_is_bool,
+    rule_cond_start,
+    rule_cond_end,
+    rule_strength,
+    rule_conclusion_idx,
+    values_f,
+    values_has,
+    inferred_conf,
+    inferred_has,
+    fired,
+    ev_rule,
+    ev_conf,
+    n_events,
+):
+    """One pass over all rules in order. Each firing is appended to
+    ``ev_rule``/``ev_conf`` as (rule index, premise confidence * strength)."""
+    changed = False
+    for r in range(rule_strength.shape[0]):
+        if fired[r]:
+            continue
+
+        premises_met = True
+        min_premise_confidence = 1.0
+        for k in range(rule_cond_start[r], rule_cond_end[r]):
+            f = cond_fact_idx[k]
+            if values_has[f]:
+                current_val = values_f[f]
+            elif inferred_has[f]:
+                current_val = inferred_conf[f]
+                if cond_is_bool[k]:
+                    current_val = 1.0 if current_val > 0.0 else 0.0
+            else:
+                premises_met = False
+                break
+
+            target_val = cond_target[k]
+            if cond_is_bool[k]:
+                ok = (current_val != 0.0) == (target_val != 0.0)
+            else:
+                op = cond_op[k]
+                if op == 0:
+                    ok = current_val > target_val
+                elif op == 1:
+                    ok = current_val < target_val
+                elif op == 2:
+                    ok = current_val >= target_val
+                elif op == 3:
+                    ok = current_val <= target_val
+                elif op == 4:
+                    ok = current_val == target_val
+                elif op == 5:
+                    ok = current_val != target_val
+                else:
+                    ok = False
+            if not ok:
+                premises_met = False
+                break
+
+            conf = inferred_conf[f] if inferred_has[f] else 1.0
+            if conf < min_premise_confidence:
+                min_premise_confidence = conf
+
+        if not premises_met:
+            continue
+
+        c = rule_conclusion_idx[r]
+        new_conf = min_premise_confidence * rule_strength[r]
+        fired[r] = 1
+        ev_rule[n_events] = r
+        ev_conf[n_events] = new_conf
+        n_events += 1
+
+        if not inferred_has[c]:
+            inferred_conf[c] = new_conf
+            inferred_has[c] = True
+            values_f[c] = 1.0
+            values_has[c] = True
+            changed = True
+        else:
+            prev_conf = inferred_conf[c]
+            combined = prev_conf + new_conf - prev_conf * new_conf
+            if combined > prev_conf + 1e-12:
+                inferred_conf[c] = combined
+                changed = True
+    return changed, n_events
+
+
+if njit is not None:
+    _chain = njit(
+        "Tuple((boolean, int64))(int32[:], int8[:], float64[:], boolean[:],"
+        " int32[:], int32[:], float64[:], int32[:], float64[:], boolean[:],"
+        " float64[:], boolean[:], uint8[:], int32[:], float64[:], int64)",
+        cache=True,
+    )(_chain)
+
+
+def _chain_rows(
+    cond_fact_idx,
+    cond_op,
+    cond_target,
+    cond_is_bool,
+    rule_cond_start,
+    rule_cond_end,
+    rule_strength,
+    rule_conclusion_idx,
+    values_f,
+    values_has,
+    inferred_conf,
+    inferred_has,
+    max_iterations,
+):
+    """Chain every row of the 2-D fact arrays to a fixed point, in place,
+    with the same pass loop as ``forward_chain``."""
+    n_rules = rule_strength.shape[0]
+    fired = np.zeros(n_rules, dtype=np.uint8)
+    ev_rule = np.zeros(n_rules, dtype=np.int32)
+    ev_conf = np.zeros(n_rules, dtype=np.float64)
+    for b in range(values_f.shape[0]):
+        fired[:] = 0
+        iteration = 0
+        changed = True
+        while changed and iteration < max_iterations:
+            iteration += 1
+            changed, _ = _chain(
+                cond_fact_idx,
+                cond_op,
+                cond_target,
+                cond_is_bool,
+                rule_cond_start,
+                rule_cond_end,
+                rule_strength,
+                rule_conclusion_idx,
+                values_f[b],
+                values_has[b],
+                inferred_conf[b],
+                inferred_has[b],
+                fired,
+                ev_rule,
+                ev_conf,
+                0,
+            )
+
+
+if njit is not None:
+    _chain_rows = njit(
+        "void(int32[:], int8[:], float64[:], boolean[:], int32[:], int32[:],"
+        " float64[:], int32[:], float64[:, :], boolean[:, :], float64[:, :],"
+        " boolean[:, :], int64)",
+        cache=True,
+    )(_chain_rows)
+
+
+@functools.lru_cache(maxsize=32)
+def _lowered_cached(rules: Tuple[Rule, ...]) -> Optional[LoweredRules]:
+    return lower_rules(list(rules))
+
+
+def _lowered_for(rules: List[Rule]) -> Optional[LoweredRules]:
+    return _lowered_cached(tuple(rules))
+
+
+def forward_chain(engine: InferenceEngine) -> None:
+    """Drop-in for ``engine.forward_chain()`` backed by the compiled kernel."""
+    if engine._chain is not None:
+        engine.forward_chain()  # the generated chain is already faster
+        return
+    lowered = _lowered_for(engine.rules) if njit is not None else None
+    if lowered is None:
+        engine.forward_chain()
+        return
+
+    n_facts = len(lowered.fact_idx)
+    values_f = np.zeros(n_facts, dtype=np.float64)
+    values_has = np.zeros(n_facts, dtype=np.bool_)
+    inferred_conf = np.zeros(n_facts, dtype=np.float64)
+    inferred_has = np.zeros(n_facts, dtype=np.bool_)
+    values, inferred = engine.values, engine.inferred_facts
+    for name, i in lowered.fact_idx.items():
+        if name in values:
+            value = values[name]
+            if not _is_number(value):
+                engine.forward_chain()
+                return
+            values_f[i] = value
+            values_has[i] = True
+        if name in inferred:
+            inferred_conf[i] = inferred[name]
+            inferred_has[i] = True
+
+    rules = lowered.rules
+    fired_ids = engine.fired_rules
+    fired = np.array([rule.id in fired_ids for rule in rules], np.uint8)
+    ev_rule = np.zeros(len(rules), dtype=np.int32)
+    ev_conf = np.zeros(len(rules), dtype=np.float64)
+
+    max_iterations = max(50, len(rules) * 3)
+    iteration = 0
+    changed = True
+    n_events = 0
+    while changed and iteration < max_iterations:
+        iteration += 1
+        changed, n_events = _chain(
+            lowered.cond_fact_idx,
+            lowered.cond_op,
+            lowered.cond_target,
+            lowered.cond_is_bool,
+            lowered.rule_cond_start,
+            lowered.rule_cond_end,
+            lowered.rule_strength,
+            lowered.rule_conclusion_idx,
+            values_f,
+            values_has,
+            inferred_conf,
+            inferred_has,
+            fired,
+            ev_rule,
+            ev_conf,
+            n_events,
+        )
+
+    engine._ensure_slots()
+    for e in range(n_events):
+        engine._apply_rule(rules[ev_rule[e]], float(ev_conf[e]))
+    # the kernel re-scanned every rule, so nothing is left on the engine agenda
+    if not changed:
+        engine._queued.clear()
+
+
+def score_batch(df, rules: List[Rule] = ALL_RULES):
+    """``expert_system_batch.score_batch`` with all rows chained in one
+    compiled call."""
+    lowered = _lowered_for(rules) if njit is not None else None
+    if lowered is None:
+        return expert_system_batch.score_batch(df, rules)
+
+    slots = [FACT_IDX[name] for name in lowered.fact_idx]
+    val, val_has = expert_system_batch._load_facts(df, slots)
+    n = len(df)
+    shape = (n, len(slots))
+    # one row per transaction, so each row's facts are contiguous for the kernel
+    values_f = np.ascontiguousarray(np.array([val[i] for i in slots]).T)
+    values_has = np.ascontiguousarray(np.array([val_has[i] for i in slots]).T)
+    inferred_conf = np.zeros(shape)
+    inferred_has = np.zeros(shape, dtype=np.bool_)
+
+    _chain_rows(
+        lowered.cond_fact_idx,
+        lowered.cond_op,
+        lowered.cond_target,
+        lowered.cond_is_bool,
+        lowered.rule_cond_start,
+        lowered.rule_cond_end,
+        lowered.rule_strength,
+        lowered.rule_conclusion_idx,
+        values_f,
+        values_has,
+        inferred_conf,
+        inferred_has,
+        1 if lowered.single_pass else max(50, len(lowered.rules) * 3),
+    )
+
+    conf = {i: inferred_conf[:, k] for k, i in enumerate(slots)}
+    conf_has = {i: inferred_has[:, k] for k, i in enumerate(slots)}
+    for name in RISK_FACTS + ACTIONS:  # never concluded by these rules
+        i = FACT_IDX[name]
+        if i not in conf:
+            conf[i], conf_has[i] = np.zeros(n), np.zeros(n, dtype=bool)
+    return expert_system_batch._summarize(conf, conf_has, df.index)
@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from expert_system import InferenceEngine, ALL_RULES  # noqa: E402
+from expert_system_batch import (  # noqa: E402
+    combine_confidence,
+    pack_confidences,
+    risk_levels,
+)
+
+TRANSACTIONS = [
+    {"amount": 1, "ip_risk_score": 0, "account_age_days": 400},
+    {"amount": 2000, "ip_risk_score": 90, "account_age_days": 2, "vpn_detected": True},
+    {"amount": 800, "country_mismatch": True, "device_seen_before": False},
+    {"transactions_last_hour": 7, "ip_risk_score": 55, "phone_verified": False},
+]
+
+
+def make_engines():
+    engines = []
+    for data in TRANSACTIONS:
+        engine = InferenceEngine(ALL_RULES)
+        engine.load_data(data)
+        engine.forward_chain()
+        engines.append(engine)
+    return engines
+
+
+def test_combine_confidence_matches_scalar():
+    engine = InferenceEngine(ALL_RULES)
+    c1 = np.array([0.0, 0.2, 1.0, 0.45])
+    c2 = np.array([0.45, 0.3, 0.5, 0.45])
+    expected = [engine._combine_confidence(a, b) for a, b in zip(c1, c2)]
+    assert combine_confidence(c1, c2) == pytest.approx(expected)
+
+
+def test_risk_levels_match_engine():
+    engines = make_engines()
+    conf, has_fact = pack_confidences(e.inferred_facts for e in engines)
+    assert conf.shape == has_fact.shape == (len(engines), conf.shape[1])
+    expected = [e.calculate_risk_level() for e in engines]
+    assert risk_levels(conf) == pytest.approx(expected)
+
+
+def test_risk_levels_sum_in_engine_order():
+    # many overlapping indicators, where summation order shows in the last bit
+    rng = random.Random(0)
+    engines = []
+    for _ in range(300):
+        engine = InferenceEngine(ALL_RULES)
+        engine.load_data(
+            {
+                "amount": rng.randint(0, 3000),
+                "ip_risk_score": rng.randint(0, 100),
+                "account_age_days": rng.randint(0, 400),
+                "failed_logins_24h": rng.randint(0, 10),
+                "transactions_last_hour": rng.randint(0, 8),
+                "email_age_days": rng.randint(0, 200),
+                "country_mismatch": rng.random() < 0.5,
+                "device_seen_before": rng.random() < 0.5,
+                "billing_shipping_mismatch": rng.random() < 0.5,
+                "vpn_detected": rng.random() < 0.5,
+            }
+        )
+        engine.forward_chain()
+        engines.append(engine)
+    conf, _ = pack_confidences(e.inferred_facts for e in engines)
+    assert risk_levels(conf).tolist() == [e.calculate_risk_level() for e in engines]
+
+
+def test_score_batch_matches_engine_per_row():
+    pd = pytest.importorskip("pandas")
+    from expert_system_batch import score_batch
+
+    df = pd.DataFrame(TRANSACTIONS + [{"amount": 20, "past_chargebacks": 1}])
+    scored = score_batch(df)
+    assert list(scored.index) == list(df.index)
+    for (_, row), data in zip(scored.iterrows(), TRANSACTIONS):
+        engine = InferenceEngine(ALL_RULES)
+        engine.load_data(data)
+        engine.forward_chain()
+        for action in ("DECLINE_recommended", "APPROVE_recommended"):
+            if action in engine.inferred_facts:
+                assert row[action] == pytest.approx(engine.inferred_facts[action])
+            else:
+                assert np.isnan(row[action])
+        assert row["risk_level"] == pytest.approx(engine.calculate_risk_level())
+        assert row["recommendation"] == engine.get_recommendations()[0][0]
@@ -1,7 +1,9 @@
 import copy
+import gc
 import pytest
 
-from expert_system import InferenceEngine, Rule, ALL_RULES
+import expert_system
+from expert_system import InferenceEngine, Rule, ALL_RULES, run_expert_system
 
 
 def make_engine(rules=None):
@@ -97,3 +99,237 @@ def test_trace_populated_on_rule_fire():
     assert len(engine.trace) > 0
     # trace entries should be human-readable strings
     assert any("Fired" in t or "Updated" in t for t in engine.trace)
+
+
+def test_forward_chain_reactivates_dependents_of_new_data():
+    rules = [
+        Rule("R1", [("amount", ">", 10)], "high_amount", 0.6),
+        Rule("R2", [("high_amount", "==", True), ("vpn", "==", True)], "risky", 0.5),
+    ]
+    engine = make_engine(rules)
+    engine.load_data({"amount": 20})
+    engine.forward_chain()
+    assert "risky" not in engine.inferred_facts
+    # R2 only becomes satisfiable once "vpn" arrives in a later load
+    engine.load_data({"vpn": True})
+    engine.forward_chain()
+    assert engine.inferred_facts["risky"] == pytest.approx(0.6 * 0.5)
+
+
+def test_rule_evaluate_matches_eval_condition():
+    conditions = [
+        ("amount", ">", 500),
+        ("amount", "<=", 500),
+        ("device_seen_before", "==", False),
+        ("device_seen_before", "==", True),
+        ("high_amount", "==", True),
+        ("high_amount", ">", 0.5),
+        ("amount_str", ">", 5),
+        ("amount", "~", 5),
+        ("missing_fact", "==", True),
+    ]
+    rules = [Rule("R", [c], "out", 1.0) for c in conditions]
+    engine = make_engine()
+    engine.load_data({"amount": 700, "device_seen_before": False, "amount_str": "x"})
+    engine.inferred_facts["high_amount"] = 0.6
+    slots = (
+        engine._values,
+        engine._value_set,
+        engine._inferred,
+        engine._inferred_set,
+    )
+    for cond, rule in zip(conditions, rules):
+        assert rule.evaluate(*slots) == engine._eval_condition(cond), cond
+
+
+def test_risk_cache_invalidated_by_forward_chain():
+    engine = make_engine()
+    engine.load_data({"amount": 1, "ip_risk_score": 0, "account_age_days": 400})
+    engine.forward_chain()
+    assert engine.calculate_risk_level() == pytest.approx(0.0)
+    assert engine.get_active_risk_indicators() == []
+    engine.load_data({"ip_risk_score": 90})
+    engine.forward_chain()
+    assert "high_ip_risk" in engine.get_active_risk_indicators()
+    assert engine.calculate_risk_level() > 0.0
+
+
+def test_fact_views_behave_like_dicts():
+    engine = make_engine()
+    engine.load_data({"amount": 2000, "never_used_by_rules": "x"})
+    engine.forward_chain()
+    assert engine.values["never_used_by_rules"] == "x"
+    assert "high_amount" in engine.values and engine.values["high_amount"] is True
+    assert dict(engine.inferred_facts) == {
+        k: engine.inferred_facts[k] for k in engine.inferred_facts
+    }
+    assert engine.inferred_facts.get("missing", 0.0) == 0.0
+    del engine.inferred_facts["high_amount"]
+    assert "high_amount" not in engine.inferred_facts
+    with pytest.raises(KeyError):
+        engine.inferred_facts["high_amount"]
+
+
+def test_keys_no_rule_reads_stay_out_of_the_slot_table():
+    n_slots = len(expert_system.FACT_NAMES)
+    engine = make_engine()
+    engine.load_data({"amount": 2000, "unlisted_key_1": 1, "unlisted_key_2": 2})
+    engine.forward_chain()
+    assert len(expert_system.FACT_NAMES) == n_slots
+    assert list(engine.values)[:3] == ["amount", "unlisted_key_1", "unlisted_key_2"]
+    del engine.values["unlisted_key_1"]
+    assert "unlisted_key_1" not in engine.values
+    # a rule built later reads a value that was loaded before it had a slot
+    engine.set_fact("late_rule_input", 7)
+    rule = Rule("L", [("late_rule_input", ">", 5)], "late_rule_output", 0.5)
+    late = make_engine([rule])
+    late.set_fact("late_rule_input", 7)
+    late.forward_chain()
+    assert late.inferred_facts["late_rule_output"] == pytest.approx(0.5)
+    assert engine.values["late_rule_input"] == 7
+    engine.forward_chain()  # grows the engine's slots past the new fact
+    assert engine.values["late_rule_input"] == 7
+    assert list(engine.values).count("late_rule_input") == 1
+
+
+def test_engines_are_freed_without_the_cycle_collector():
+    gc.collect()
+    gc.disable()
+    try:
+        engine = make_engine()
+        engine.load_data({"amount": 2000})
+        engine.forward_chain()
+        engine.values["extra"] = 1
+        engine.inferred_facts.get("high_amount")
+        del engine
+        assert gc.collect() == 0
+    finally:
+        gc.enable()
+
+
+def test_rules_run_after_all_producers_of_their_premises():
+    # D is listed between the two rules concluding "x"; dependency ordering
+    # must still let it see the combined confidence of both
+    rules = [
+        Rule("P1", [("amount", ">", 10)], "x", 0.5),
+        Rule("D", [("x", "==", True)], "y", 1.0),
+        Rule("P2", [("amount", ">", 20)], "x", 0.5),
+    ]
+    engine = make_engine(rules)
+    engine.load_data({"amount": 30})
+    engine.forward_chain()
+    assert engine.inferred_facts["x"] == pytest.approx(0.75)
+    assert engine.inferred_facts["y"] == pytest.approx(0.75)
+
+
+def test_set_fact_does_not_reapply_defaults():
+    engine = make_engine()
+    engine.load_data({"account_age_days": 400, "past_chargebacks": 2})
+    engine.forward_chain()
+    engine.set_fact("otp_passed", True)
+    engine.forward_chain()
+    assert engine.values["past_chargebacks"] == 2
+    assert "legitimate_user" in engine.inferred_facts
+    assert "trusted_history" not in engine.inferred_facts
+
+
+def test_rules_sharing_an_id_fire_once():
+    rules = [
+        Rule("X", [("amount", ">", 10)], "a", 0.5),
+        Rule("X", [("amount", ">", 5)], "b", 0.5),
+    ]
+    engine = make_engine(rules)
+    engine.load_data({"amount": 20})
+    engine.forward_chain()
+    assert engine.fired_rules == {"X"}
+    assert "a" in engine.inferred_facts
+    assert "b" not in engine.inferred_facts
+
+
+def test_generated_chain_matches_generic_loop():
+    data = {
+        "amount": 2500,
+        "device_seen_before": False,
+        "country_mismatch": True,
+        "vpn_detected": True,
+        "ip_risk_score": 85,
+        "email_age_days": 3,
+    }
+    specialized = make_engine()
+    generic = make_engine(list(ALL_RULES))  # a copy takes the generic path
+    assert specialized._chain is not None and generic._chain is None
+    for engine in (specialized, generic):
+        engine.load_data(data)
+        engine.forward_chain()
+        engine.set_fact("otp_passed", False)
+        engine.forward_chain()
+    assert specialized.inferred_facts == generic.inferred_facts
+    assert specialized.fired_rules == generic.fired_rules
+    assert specialized.trace == generic.trace
+    assert len(specialized.fired_rules) > 3
+
+
+def test_run_expert_system_quiet_mode(capsys):
+    data = {"amount": 2000, "ip_risk_score": 90, "account_age_days": 2}
+    answers = {"user_confirmed_transaction": False, "otp_passed": False}
+    loud = run_expert_system(data, answers)
+    report = capsys.readouterr().out
+    assert "REASONING TRACE" in report
+    quiet = run_expert_system(data, answers, verbose=False)
+    assert capsys.readouterr().out == ""
+    assert quiet.trace == loud.trace
+
+
+def test_quiet_mode_builds_no_report():
+    class Unprintable:
+        def __format__(self, spec):
+            raise AssertionError("report line formatted")
+
+    data = {"amount": 2000, "ip_risk_score": 90, "note": Unprintable()}
+    answers = {"user_confirmed_transaction": False, "otp_passed": False}
+    engine = run_expert_system(data, answers, verbose=False)
+    assert engine.trace
+
+
+def test_quiet_mode_still_shows_interactive_questions(capsys, monkeypatch):
+    monkeypatch.setattr("builtins.input", lambda prompt: "yes")
+    data = {"amount": 2000, "ip_risk_score": 90, "account_age_days": 2}
+    run_expert_system(data, {}, verbose=False)
+    written = capsys.readouterr().out
+    assert written.startswith("\n[?] ")
+    assert "REASONING TRACE" not in written
+
+
+def test_engines_on_the_same_rule_list_share_a_plan():
+    rules = [
+        Rule("R1", [("amount", ">", 10)], "high_amount", 0.6),
+        Rule("R2", [("high_amount", "==", True)], "review", 0.5),
+    ]
+    first, second = make_engine(rules), make_engine(rules)
+    assert first._ordered_rules is second._ordered_rules
+    assert first.rule_deps is second.rule_deps
+    rules.append(Rule("R3", [("amount", "<", 5)], "low_amount", 0.4))
+    third = make_engine(rules)  # edited in place: planned again
+    assert len(third._ordered_rules) == 3
+    assert len(first._ordered_rules) == 2
+
+
+def test_plan_cache_is_bounded():
+    for n in range(100):
+        make_engine([Rule(f"T{n}", [("amount", ">", n)], "high_amount", 0.5)])
+    info = expert_system._cached_plan.cache_info()
+    assert info.currsize <= info.maxsize
+
+
+def test_generated_chain_only_evaluates_queued_rules():
+    for engine in (make_engine(), make_engine(list(ALL_RULES))):
+        engine.load_data({"amount": 1})
+        engine.forward_chain()
+        assert not engine._queued
+        # written behind the engine's back, so no rule is queued to see it
+        engine._values[expert_system.FACT_IDX["amount"]] = 5000
+        engine.forward_chain()
+        assert "very_high_amount" not in engine.inferred_facts
+        engine.set_fact("amount", 5000)
+        engine.forward_chain()
+        assert "very_high_amount" in engine.inferred_facts
@@ -0,0 +1,85 @@
+import pytest
+
+pytest.importorskip("numba")
+
+from expert_system import InferenceEngine, Rule, ALL_RULES  # noqa: E402
+from expert_system_numba import forward_chain, lower_rules  # noqa: E402
+
+# a copy: engines built on ALL_RULES itself run their generated chain and
+# never reach the kernel
+KERNEL_RULES = list(ALL_RULES)
+
+TRANSACTIONS = [
+    {"amount": 1, "ip_risk_score": 0, "account_age_days": 400},
+    {"amount": 2000, "ip_risk_score": 90, "account_age_days": 2, "vpn_detected": True},
+    {"amount": 800, "country_mismatch": True, "device_seen_before": False},
+    {"transactions_last_hour": 7, "ip_risk_score": 55, "phone_verified": False},
+    {
+        "amount": 900,
+        "shipping_address_changed_recently": True,
+        "country_mismatch": True,
+    },
+]
+
+
+def run_both(rules, *loads):
+    interpreted, compiled = InferenceEngine(rules), InferenceEngine(rules)
+    for data in loads:
+        interpreted.load_data(data)
+        interpreted.forward_chain()
+        compiled.load_data(data)
+        forward_chain(compiled)
+    return interpreted, compiled
+
+
+def assert_same_state(a, b):
+    assert list(a.inferred_facts.items()) == list(b.inferred_facts.items())
+    assert a.trace == b.trace
+    assert a.fired_rules == b.fired_rules
+    assert a.get_recommendations() == b.get_recommendations()
+
+
+@pytest.mark.parametrize("data", TRANSACTIONS)
+def test_kernel_matches_interpreted_engine(data):
+    assert_same_state(
+        *run_both(KERNEL_RULES, data, {"user_confirmed_transaction": True})
+    )
+
+
+def test_kernel_handles_circular_rules():
+    rules = [
+        Rule("A1", [("fact_a", "==", True)], "fact_b", 0.8),
+        Rule("B1", [("fact_b", "==", True)], "fact_a", 0.7),
+    ]
+    interpreted, compiled = run_both(rules, {"fact_a": True})
+    assert_same_state(interpreted, compiled)
+    assert {"A1", "B1"}.issubset(compiled.fired_rules)
+
+
+def test_non_numeric_inputs_fall_back_to_interpreted_engine():
+    assert lower_rules([Rule("S", [("country", "==", "US")], "domestic", 0.5)]) is None
+    assert lower_rules(KERNEL_RULES) is not None  # so the loaded value decides
+    interpreted, compiled = run_both(
+        KERNEL_RULES, {"amount": "n/a", "ip_risk_score": 90}
+    )
+    assert_same_state(interpreted, compiled)
+
+
+@pytest.mark.parametrize(
+    "rules",
+    [
+        ALL_RULES,
+        [
+            Rule("A1", [("fact_a", "==", True)], "fact_b", 0.8),
+            Rule("B1", [("fact_b", "==", True)], "fact_a", 0.7),
+            Rule("H", [("fact_b", "==", True)], "DECLINE_recommended", 0.6),
+        ],
+    ],
+)
+def test_score_batch_matches_numpy_batch(rules):
+    pd = pytest.importorskip("pandas")
+    from expert_system_batch import score_batch as numpy_score_batch
+    from expert_system_numba import score_batch
+
+    df = pd.DataFrame(TRANSACTIONS + [{"fact_a": True}, {"fact_a": False}])
+    pd.testing.assert_frame_equal(score_batch(df, rules), numpy_score_batch(df, rules))